@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Optional, Literal
 from datetime import datetime
 import uuid
 
@@ -76,6 +76,23 @@ class ContactMessageResponse(BaseModel):
     message: str
     contact_id: Optional[str] = None
 
+class ContactStatusUpdate(BaseModel):
+    id: str
+    status: Literal["read", "replied"]
+
+class ContactBulkStatusUpdate(BaseModel):
+    updates: List[ContactStatusUpdate] = Field(..., min_length=1, max_length=500)
+
+class ContactStatusUpdateResult(BaseModel):
+    id: str
+    status: Optional[str] = None
+    result: str  # updated, unchanged, not_found, conflict, error
+
+class ContactBulkStatusUpdateResponse(BaseModel):
+    success: bool
+    modified_count: int
+    results: List[ContactStatusUpdateResult]
+
 # Portfolio Data Models
 class SkillCategory(BaseModel):
     name: str
@@ -106,6 +123,7 @@ class PortfolioData(BaseModel):
     skills: List[SkillCategory]
     experience: List[Experience]
     projects: List[GitHubRepoWithLanguages]
+    partial: bool = False  # True when some upstream data missed the deadline
     
 # GitHub API Response Models
 class GitHubAPIResponse(BaseModel):
@@ -1,22 +1,27 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import json
+import asyncio
 import logging
 from pathlib import Path
-from typing import List, Optional
+from typing import List, Optional, AsyncIterator, Dict, Any
 from datetime import datetime
 
 # Import models and services
 from models import (
     ContactMessageCreate, ContactMessageResponse, 
+    ContactBulkStatusUpdate, ContactBulkStatusUpdateResponse,
     GitHubRepoWithLanguages, GitHubUser, GitHubAPIResponse,
     PortfolioData, PersonalInfo, SkillCategory, Experience
 )
 from services.github_service import GitHubService
 from services.contact_service import ContactService
+from services.metrics_service import MetricsService
+from services.deadline import Deadline, deadline_scope, stream_within_deadline
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -26,8 +31,14 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Per-endpoint time budgets (seconds) shared by every upstream and Mongo call
+GITHUB_DEADLINE_SECONDS = float(os.getenv("GITHUB_DEADLINE_SECONDS", "8"))
+PORTFOLIO_DEADLINE_SECONDS = float(os.getenv("PORTFOLIO_DEADLINE_SECONDS", "6"))
+GITHUB_STREAM_DEADLINE_SECONDS = float(os.getenv("GITHUB_STREAM_DEADLINE_SECONDS", "15"))
+
 # Initialize services
-github_service = GitHubService(db)
+metrics_service = MetricsService(db)
+github_service = GitHubService(db, metrics_service)
 contact_service = ContactService(db)
 
 # Create the main app without a prefix
@@ -36,6 +47,24 @@ app = FastAPI(title="Michael Tallada Portfolio API", version="1.0.0")
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+def ndjson_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """Serialize an async stream of events as newline-delimited JSON"""
+    async def body():
+        async for event in events:
+            yield json.dumps(event, default=str) + "\n"
+    
+    return StreamingResponse(
+        body(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def flag_partial(response: Response, deadline: Deadline) -> None:
+    """Mark a response assembled after the deadline ran out as partial"""
+    if deadline.partial:
+        response.headers["X-Partial-Response"] = "true"
+        response.headers["X-Partial-Sources"] = ",".join(deadline.degraded)
+
 # Original endpoints
 @api_router.get("/")
 async def root():
@@ -43,34 +72,75 @@ async def root():
 
 # GitHub endpoints
 @api_router.get("/github/user", response_model=GitHubUser)
-async def get_github_user():
+async def get_github_user(response: Response):
     """Get GitHub user information"""
-    user = await github_service.get_user_info()
+    with deadline_scope(GITHUB_DEADLINE_SECONDS) as deadline:
+        user = await github_service.get_user_info()
     if not user:
+        if deadline.partial:
+            raise HTTPException(status_code=503, detail="GitHub user information temporarily unavailable")
         raise HTTPException(status_code=404, detail="GitHub user not found")
+    flag_partial(response, deadline)
     return user
 
 @api_router.get("/github/repositories", response_model=List[GitHubRepoWithLanguages])
-async def get_github_repositories(limit: int = 10, sort: str = "updated"):
+async def get_github_repositories(response: Response, limit: int = 10, sort: str = "updated"):
     """Get GitHub repositories with language information"""
     if limit > 50:
         raise HTTPException(status_code=400, detail="Limit cannot exceed 50")
     
-    repos = await github_service.get_repositories(limit=limit, sort=sort)
+    with deadline_scope(GITHUB_DEADLINE_SECONDS) as deadline:
+        repos = await github_service.get_repositories(limit=limit, sort=sort)
+    flag_partial(response, deadline)
     return repos
 
+@api_router.get("/github/repositories/stream")
+async def stream_github_repositories(limit: int = 10, sort: str = "updated"):
+    """Stream repositories as NDJSON as their language information resolves"""
+    if limit > 50:
+        raise HTTPException(status_code=400, detail="Limit cannot exceed 50")
+    
+    return ndjson_response(stream_within_deadline(
+        GITHUB_STREAM_DEADLINE_SECONDS,
+        github_service.stream_repositories(limit=limit, sort=sort)
+    ))
+
 @api_router.get("/github/featured", response_model=List[GitHubRepoWithLanguages])
-async def get_featured_repositories():
+async def get_featured_repositories(response: Response):
     """Get featured repositories (pinned or most starred)"""
-    repos = await github_service.get_featured_repositories()
+    with deadline_scope(GITHUB_DEADLINE_SECONDS) as deadline:
+        repos = await github_service.get_featured_repositories()
+    flag_partial(response, deadline)
     return repos
 
+@api_router.get("/github/featured/stream")
+async def stream_featured_repositories():
+    """Stream featured repositories as NDJSON as their language information resolves"""
+    return ndjson_response(stream_within_deadline(
+        GITHUB_STREAM_DEADLINE_SECONDS,
+        github_service.stream_featured_repositories()
+    ))
+
 @api_router.get("/github/stats")
-async def get_github_stats():
+async def get_github_stats(response: Response):
     """Get GitHub repository statistics"""
-    stats = await github_service.get_repository_stats()
+    with deadline_scope(GITHUB_DEADLINE_SECONDS) as deadline:
+        stats = await github_service.get_repository_stats()
+    flag_partial(response, deadline)
     return stats
 
+@api_router.get("/github/trends")
+async def get_github_trends(days: int = 90, repo: Optional[str] = None, interval: str = "day"):
+    """Get repository metric trends (stars, forks, issues, size, languages) over time"""
+    if days < 1 or days > metrics_service.max_range_days:
+        raise HTTPException(status_code=400, detail=f"Days must be between 1 and {metrics_service.max_range_days}")
+    if interval not in ("day", "week"):
+        raise HTTPException(status_code=400, detail="Interval must be 'day' or 'week'")
+    
+    with deadline_scope(GITHUB_DEADLINE_SECONDS):
+        trends = await metrics_service.get_trends(days=days, repo=repo, interval=interval)
+    return trends
+
 # Contact endpoints
 @api_router.post("/contact", response_model=ContactMessageResponse)
 async def create_contact_message(message: ContactMessageCreate, request: Request):
@@ -85,6 +155,12 @@ async def get_contact_messages(limit: int = 50, skip: int = 0):
     messages = await contact_service.get_contact_messages(limit=limit, skip=skip)
     return messages
 
+@api_router.patch("/contact/messages/status", response_model=ContactBulkStatusUpdateResponse)
+async def update_contact_message_statuses(payload: ContactBulkStatusUpdate):
+    """Bulk update contact message statuses (admin endpoint)"""
+    response = await contact_service.update_message_statuses(payload.updates)
+    return response
+
 @api_router.get("/contact/stats")
 async def get_contact_stats():
     """Get contact message statistics"""
@@ -93,12 +169,15 @@ async def get_contact_stats():
 
 # Portfolio data endpoint
 @api_router.get("/portfolio")
-async def get_portfolio_data():
+async def get_portfolio_data(response: Response):
     """Get complete portfolio data"""
     try:
-        # Get GitHub data
-        github_user = await github_service.get_user_info()
-        github_repos = await github_service.get_featured_repositories()
+        # Get GitHub data concurrently within one budget
+        with deadline_scope(PORTFOLIO_DEADLINE_SECONDS) as deadline:
+            github_user, github_repos = await asyncio.gather(
+                github_service.get_user_info(),
+                github_service.get_featured_repositories()
+            )
         
         # Static portfolio data (from resume)
         personal_info = PersonalInfo(
@@ -176,9 +255,11 @@ async def get_portfolio_data():
             personal=personal_info,
             skills=skills,
             experience=experience,
-            projects=github_repos
+            projects=github_repos,
+            partial=deadline.partial
         )
         
+        flag_partial(response, deadline)
         return portfolio_data
         
     except Exception as e:
@@ -200,6 +281,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Partial-Response", "X-Partial-Sources"],
 )
 
 # Configure logging
@@ -209,6 +291,10 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def ensure_metrics_collections():
+    await metrics_service.ensure_collections()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
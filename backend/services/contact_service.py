@@ -1,12 +1,17 @@
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from typing import Optional, List, Dict, Set, Tuple
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from models import ContactMessage, ContactMessageCreate, ContactMessageResponse
+from pymongo import UpdateMany
+from models import (
+    ContactMessage, ContactMessageCreate, ContactMessageResponse,
+    ContactStatusUpdate, ContactStatusUpdateResult, ContactBulkStatusUpdateResponse
+)
 import logging
 import os
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +74,109 @@ class ContactService:
             logger.error(f"Error marking message as read: {str(e)}")
             return False
     
+    async def update_message_statuses(self, updates: List[ContactStatusUpdate]) -> ContactBulkStatusUpdateResponse:
+        """Apply status changes to many contact messages in a single bulk write"""
+        # Last update wins if the same id is submitted more than once
+        target_status: Dict[str, str] = {}
+        for update in updates:
+            target_status[update.id] = update.status
+        
+        try:
+            existing = await self._get_message_statuses(list(target_status))
+            
+            # Group the ids that actually change by their target status
+            ids_by_status: Dict[str, List[str]] = {}
+            for message_id, status in target_status.items():
+                if message_id in existing and existing[message_id] != status:
+                    ids_by_status.setdefault(status, []).append(message_id)
+            
+            planned_ids = [message_id for ids in ids_by_status.values() for message_id in ids]
+            applied: Set[str] = set(planned_ids)
+            current = None
+            modified_count = 0
+            if ids_by_status:
+                # The status filter keeps the write idempotent if another admin got there first;
+                # the token tells this request's writes apart from theirs
+                update_id = str(uuid.uuid4())
+                operations = [
+                    UpdateMany(
+                        {"id": {"$in": ids}, "status": {"$ne": status}},
+                        {"$set": {"status": status, "status_update_id": update_id}}
+                    )
+                    for status, ids in ids_by_status.items()
+                ]
+                result = await self.db.contact_messages.bulk_write(operations, ordered=False)
+                modified_count = result.modified_count
+                
+                if modified_count < len(planned_ids):
+                    # Some messages changed between the read and the write; find out which ones we wrote
+                    current, applied = await self._get_applied_updates(planned_ids, update_id)
+            
+            return ContactBulkStatusUpdateResponse(
+                success=True,
+                modified_count=modified_count,
+                results=self._classify_status_updates(target_status, existing, applied, current)
+            )
+            
+        except Exception as e:
+            logger.error(f"Error updating message statuses: {str(e)}")
+            return ContactBulkStatusUpdateResponse(
+                success=False,
+                modified_count=0,
+                results=[
+                    ContactStatusUpdateResult(id=message_id, status=status, result="error")
+                    for message_id, status in target_status.items()
+                ]
+            )
+    
+    async def _get_message_statuses(self, message_ids: List[str]) -> Dict[str, str]:
+        """Get the current status of each existing message id"""
+        cursor = self.db.contact_messages.find(
+            {"id": {"$in": message_ids}},
+            {"_id": 0, "id": 1, "status": 1}
+        )
+        return {doc["id"]: doc.get("status") async for doc in cursor}
+    
+    async def _get_applied_updates(self, message_ids: List[str], update_id: str) -> Tuple[Dict[str, str], Set[str]]:
+        """Get current statuses and the ids whose last status write carries `update_id`"""
+        cursor = self.db.contact_messages.find(
+            {"id": {"$in": message_ids}},
+            {"_id": 0, "id": 1, "status": 1, "status_update_id": 1}
+        )
+        current: Dict[str, str] = {}
+        applied: Set[str] = set()
+        async for doc in cursor:
+            current[doc["id"]] = doc.get("status")
+            if doc.get("status_update_id") == update_id:
+                applied.add(doc["id"])
+        return current, applied
+    
+    @staticmethod
+    def _classify_status_updates(
+        target_status: Dict[str, str],
+        before: Dict[str, str],
+        applied: Set[str],
+        current: Optional[Dict[str, str]] = None
+    ) -> List[ContactStatusUpdateResult]:
+        """Build per-id results; `current` is only given when the write modified fewer messages than planned"""
+        results = []
+        for message_id, status in target_status.items():
+            if message_id not in before:
+                outcome = "not_found"
+            elif before[message_id] == status:
+                outcome = "unchanged"
+            elif message_id in applied:
+                outcome = "updated"
+            elif current is None or message_id not in current:
+                outcome = "not_found"
+            elif current[message_id] == status:
+                # Another writer got it to the target first
+                outcome = "unchanged"
+            else:
+                outcome = "conflict"
+            results.append(ContactStatusUpdateResult(id=message_id, status=status, result=outcome))
+        return results
+    
     async def _send_email_notification(self, message: ContactMessage) -> bool:
         """Send email notification for new contact message"""
         try:
@@ -119,6 +227,7 @@ class ContactService:
             total_messages = await self.db.contact_messages.count_documents({})
             new_messages = await self.db.contact_messages.count_documents({"status": "new"})
             read_messages = await self.db.contact_messages.count_documents({"status": "read"})
+            replied_messages = await self.db.contact_messages.count_documents({"status": "replied"})
             
             # Recent messages (last 30 days)
             thirty_days_ago = datetime.utcnow() - timedelta(days=30)
@@ -130,6 +239,7 @@ class ContactService:
                 "total_messages": total_messages,
                 "new_messages": new_messages,
                 "read_messages": read_messages,
+                "replied_messages": replied_messages,
                 "recent_messages": recent_messages
             }
             
@@ -139,5 +249,6 @@ class ContactService:
                 "total_messages": 0,
                 "new_messages": 0,
                 "read_messages": 0,
+                "replied_messages": 0,
                 "recent_messages": 0
             }
\ No newline at end of file
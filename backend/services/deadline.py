@@ -0,0 +1,98 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Any, AsyncIterator, Awaitable, Iterator, List, Optional
+
+_current_deadline: ContextVar[Optional["Deadline"]] = ContextVar("current_deadline", default=None)
+
+class Deadline:
+    """Time budget shared by every upstream and database call of one request"""
+    
+    def __init__(self, seconds: float):
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.degraded: List[str] = []
+    
+    @property
+    def partial(self) -> bool:
+        return bool(self.degraded)
+    
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """Remaining budget, optionally capped by a per-call timeout"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(remaining, cap)
+    
+    def mark_partial(self, source: str) -> None:
+        if source not in self.degraded:
+            self.degraded.append(source)
+
+def current_deadline() -> Optional[Deadline]:
+    """Get the deadline of the request being served, if any"""
+    return _current_deadline.get()
+
+@contextmanager
+def deadline_scope(seconds: float) -> Iterator[Deadline]:
+    """Apply a deadline to everything awaited inside the block"""
+    deadline = Deadline(seconds)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+async def stream_within_deadline(seconds: float, events: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """Drive an async generator under its own deadline.
+    
+    A `deadline_scope` can't wrap a streamed body: it is left before the
+    response is iterated, and a suspended generator would leak the deadline
+    into the server's context. Instead every step of `events` runs in a
+    private context that carries the deadline.
+    """
+    context = copy_context()
+    context.run(_current_deadline.set, Deadline(seconds))
+    iterator = events.__aiter__()
+    
+    async def step() -> Any:
+        return await iterator.__anext__()
+    
+    try:
+        while True:
+            try:
+                event = await asyncio.create_task(step(), context=context)
+            except StopAsyncIteration:
+                return
+            yield event
+    finally:
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+async def within_deadline(awaitable: Awaitable[Any], cap: Optional[float] = None) -> Any:
+    """Await with the remaining request budget, raising asyncio.TimeoutError once it runs out"""
+    deadline = current_deadline()
+    timeout = deadline.timeout(cap) if deadline else cap
+    if timeout is None:
+        return await awaitable
+    if timeout <= 0:
+        # Don't leave an un-awaited coroutine behind
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise asyncio.TimeoutError()
+    return await asyncio.wait_for(awaitable, timeout)
+
+def mark_partial(source: str) -> None:
+    """Flag the current response as degraded because `source` did not finish in time"""
+    deadline = current_deadline()
+    if deadline:
+        deadline.mark_partial(source)
+
+def max_time_ms(cap: Optional[float] = None) -> Optional[int]:
+    """Server-side maxTimeMS for a Mongo query matching the remaining budget"""
+    deadline = current_deadline()
+    timeout = deadline.timeout(cap) if deadline else cap
+    if timeout is None:
+        return None
+    return max(1, int(timeout * 1000))
@@ -1,20 +1,33 @@
 import httpx
 import asyncio
 import json
-from typing import List, Optional, Dict, Any
+import os
+from typing import List, Optional, Dict, Any, AsyncIterator, Awaitable, Set, Tuple
 from datetime import datetime, timedelta
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from models import GitHubRepo, GitHubUser, GitHubLanguage, GitHubRepoWithLanguages, GitHubAPIResponse
+from models import GitHubUser, GitHubLanguage, GitHubRepoWithLanguages, GitHubAPIResponse
+from services.metrics_service import MetricsService
+from services.deadline import current_deadline, within_deadline, mark_partial, max_time_ms
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Raised when an upstream call runs out of time, either from httpx or the request deadline
+UPSTREAM_TIMEOUTS = (asyncio.TimeoutError, httpx.TimeoutException)
+
 class GitHubService:
-    def __init__(self, db: AsyncIOMotorDatabase):
+    def __init__(self, db: AsyncIOMotorDatabase, metrics_service: Optional[MetricsService] = None):
         self.db = db
+        self.metrics_service = metrics_service
         self.base_url = "https://api.github.com"
         self.username = "KuyaMecky"
         self.cache_duration = timedelta(hours=1)  # Cache for 1 hour
+        self.http_timeout = float(os.getenv("GITHUB_HTTP_TIMEOUT", "5"))
+        self.stale_read_timeout = float(os.getenv("GITHUB_STALE_READ_TIMEOUT", "0.5"))
+        self.pinned_budget_share = 0.5  # Leave the rest of the budget for the repository listing
+        # Bounds the /languages fan-out so cold listings don't trip GitHub's secondary rate limits
+        self.language_semaphore = asyncio.Semaphore(int(os.getenv("GITHUB_LANGUAGE_CONCURRENCY", "8")))
+        self._background: Set[asyncio.Task] = set()
         
     async def get_user_info(self) -> Optional[GitHubUser]:
         """Get GitHub user information"""
@@ -24,8 +37,8 @@ class GitHubService:
             if cached_data:
                 return GitHubUser(**cached_data)
             
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.base_url}/users/{self.username}")
+            async with self._client() as client:
+                response = await within_deadline(client.get(f"{self.base_url}/users/{self.username}"))
                 response.raise_for_status()
                 data = response.json()
                 
@@ -34,49 +47,63 @@ class GitHubService:
                 
                 return GitHubUser(**data)
                 
+        except UPSTREAM_TIMEOUTS:
+            logger.warning("Timed out fetching GitHub user info, falling back to last cached copy")
+            mark_partial("user_info")
+            stale_data = await self._get_stale_cached_data("user_info")
+            return GitHubUser(**stale_data) if stale_data else None
         except Exception as e:
             logger.error(f"Error fetching GitHub user info: {str(e)}")
             return None
     
     async def get_repositories(self, limit: int = 10, sort: str = "updated") -> List[GitHubRepoWithLanguages]:
         """Get user repositories with language information"""
+        cache_key = f"repos_{limit}_{sort}"
         try:
             # Check cache first
-            cache_key = f"repos_{limit}_{sort}"
             cached_data = await self._get_cached_data(cache_key)
             if cached_data:
                 return [GitHubRepoWithLanguages(**repo) for repo in cached_data]
             
-            async with httpx.AsyncClient() as client:
-                # Get repositories
-                response = await client.get(
-                    f"{self.base_url}/users/{self.username}/repos",
-                    params={
-                        "sort": sort,
-                        "per_page": limit,
-                        "type": "owner"
-                    }
-                )
-                response.raise_for_status()
-                repos_data = response.json()
+            async with self._client() as client:
+                # Get repositories (forks are skipped)
+                repos_data = await within_deadline(self._fetch_repository_list(client, limit=limit, sort=sort))
+                
+                # Get languages for each repository; lookups that miss the deadline come back as None
+                languages_by_repo = await asyncio.gather(*[
+                    self._get_repo_languages_within_deadline(client, repo_data["full_name"])
+                    for repo_data in repos_data
+                ])
                 
-                # Get languages for each repository
-                repos_with_languages = []
-                for repo_data in repos_data:
-                    if not repo_data.get('fork', False):  # Skip forked repos
-                        repo = GitHubRepo(**repo_data)
-                        languages = await self._get_repo_languages(client, repo.full_name)
-                        repo_with_languages = GitHubRepoWithLanguages(
+                if any(languages is None for languages in languages_by_repo):
+                    # Fill the gaps from the last cached copy and don't cache the incomplete result
+                    mark_partial("repository_languages")
+                    stale_data = await self._get_stale_cached_data(cache_key) or []
+                    stale_languages = {repo["id"]: repo.get("languages", []) for repo in stale_data}
+                    return [
+                        GitHubRepoWithLanguages(
                             **repo_data,
-                            languages=languages
+                            languages=languages if languages is not None else stale_languages.get(repo_data["id"], [])
                         )
-                        repos_with_languages.append(repo_with_languages)
+                        for repo_data, languages in zip(repos_data, languages_by_repo)
+                    ]
                 
-                # Cache the data
+                repos_with_languages = [
+                    GitHubRepoWithLanguages(**repo_data, languages=languages)
+                    for repo_data, languages in zip(repos_data, languages_by_repo)
+                ]
+                
+                # Cache the data and keep a metrics point for trends
                 await self._cache_data(cache_key, [repo.dict() for repo in repos_with_languages])
+                self._record_metrics(repos_with_languages)
                 
                 return repos_with_languages
                 
+        except UPSTREAM_TIMEOUTS:
+            logger.warning("Timed out fetching GitHub repositories, falling back to last cached copy")
+            mark_partial("repositories")
+            stale_data = await self._get_stale_cached_data(cache_key)
+            return [GitHubRepoWithLanguages(**repo) for repo in stale_data] if stale_data else []
         except Exception as e:
             logger.error(f"Error fetching GitHub repositories: {str(e)}")
             return []
@@ -93,18 +120,204 @@ class GitHubService:
             all_repos = await self.get_repositories(limit=20, sort="updated")
             
             # Filter and sort by stars
-            featured_repos = sorted(
-                [repo for repo in all_repos if repo.stargazers_count > 0 or repo.description],
-                key=lambda x: x.stargazers_count,
-                reverse=True
-            )[:6]
-            
-            return featured_repos
+            return self._select_featured(all_repos)
             
         except Exception as e:
             logger.error(f"Error fetching featured repositories: {str(e)}")
             return []
     
+    async def stream_repositories(self, limit: int = 10, sort: str = "updated") -> AsyncIterator[Dict[str, Any]]:
+        """Stream repositories as soon as their language data resolves"""
+        cache_key = f"repos_{limit}_{sort}"
+        cached_data = await self._get_cached_data(cache_key)
+        if cached_data:
+            for index, repo in enumerate(cached_data):
+                yield self._repository_event(index, GitHubRepoWithLanguages(**repo))
+            yield self._complete_event(len(cached_data), cached=True)
+            return
+        
+        try:
+            async with self._client() as client:
+                repos_data = await within_deadline(self._fetch_repository_list(client, limit=limit, sort=sort))
+                repos_with_languages: List[Optional[GitHubRepoWithLanguages]] = [None] * len(repos_data)
+                complete = True
+                
+                lookups = self._start_language_lookups(client, repos_data)
+                try:
+                    async for index, repo, resolved in self._resolve_languages(lookups):
+                        repos_with_languages[index] = repo
+                        complete = complete and resolved
+                        yield self._repository_event(index, repo, languages_resolved=resolved)
+                finally:
+                    # Client disconnected mid-stream: don't leave lookups running
+                    for task in lookups:
+                        task.cancel()
+                
+                if complete:
+                    await self._cache_data(cache_key, [repo.dict() for repo in repos_with_languages])
+                    self._record_metrics(repos_with_languages)
+                else:
+                    mark_partial("repository_languages")
+                yield self._complete_event(len(repos_with_languages), cached=False)
+                
+        except UPSTREAM_TIMEOUTS:
+            logger.warning("Timed out streaming GitHub repositories, falling back to last cached copy")
+            mark_partial("repositories")
+            stale_data = await self._get_stale_cached_data(cache_key) or []
+            for index, repo in enumerate(stale_data):
+                yield self._repository_event(index, GitHubRepoWithLanguages(**repo))
+            yield self._complete_event(len(stale_data), cached=True)
+        except Exception as e:
+            logger.error(f"Error streaming GitHub repositories: {str(e)}")
+            yield self._error_event("Error fetching GitHub repositories")
+    
+    async def stream_featured_repositories(self) -> AsyncIterator[Dict[str, Any]]:
+        """Stream featured repositories as soon as their language data resolves"""
+        pinned_repos = await self._get_pinned_repositories()
+        if pinned_repos:
+            for index, repo in enumerate(pinned_repos):
+                yield self._repository_event(index, repo)
+            yield self._complete_event(len(pinned_repos), cached=False)
+            return
+        
+        # Reuse the listing cache shared with get_featured_repositories
+        cached_data = await self._get_cached_data("repos_20_updated")
+        if cached_data:
+            featured_repos = self._select_featured(
+                [GitHubRepoWithLanguages(**repo) for repo in cached_data]
+            )
+            for index, repo in enumerate(featured_repos):
+                yield self._repository_event(index, repo)
+            yield self._complete_event(len(featured_repos), cached=True)
+            return
+        
+        client = self._client()
+        lookups: List[asyncio.Task] = []
+        handed_off = False
+        try:
+            repos_data = await within_deadline(self._fetch_repository_list(client, limit=20, sort="updated"))
+            # Featured selection only needs repo metadata, so pick before resolving languages
+            featured_positions = {
+                repo_data["id"]: position
+                for position, repo_data in enumerate(self._select_featured(repos_data))
+            }
+            
+            # Resolve the whole listing so it can fill the cache shared with /github/featured,
+            # but only wait on the featured repos before finishing the stream
+            lookups = self._start_language_lookups(client, repos_data)
+            featured_lookups = [lookups[index] for index, repo_data in enumerate(repos_data) if repo_data["id"] in featured_positions]
+            featured_complete = True
+            async for _, repo, resolved in self._resolve_languages(featured_lookups):
+                featured_complete = featured_complete and resolved
+                yield self._repository_event(featured_positions[repo.id], repo, languages_resolved=resolved)
+            
+            if not featured_complete:
+                mark_partial("repository_languages")
+            
+            # The rest of the listing and the cache fill carry on in the background
+            self._schedule_background(self._fill_listing_cache(client, "repos_20_updated", lookups))
+            handed_off = True
+            yield self._complete_event(len(featured_positions), cached=False)
+            
+        except UPSTREAM_TIMEOUTS:
+            logger.warning("Timed out streaming featured repositories, falling back to last cached copy")
+            mark_partial("repositories")
+            stale_data = await self._get_stale_cached_data("repos_20_updated") or []
+            featured_repos = self._select_featured([GitHubRepoWithLanguages(**repo) for repo in stale_data])
+            for index, repo in enumerate(featured_repos):
+                yield self._repository_event(index, repo)
+            yield self._complete_event(len(featured_repos), cached=True)
+        except Exception as e:
+            logger.error(f"Error streaming featured repositories: {str(e)}")
+            yield self._error_event("Error fetching featured repositories")
+        finally:
+            if not handed_off:
+                for task in lookups:
+                    task.cancel()
+                await client.aclose()
+    
+    async def _fetch_repository_list(self, client: httpx.AsyncClient, limit: int, sort: str) -> List[Dict[str, Any]]:
+        """Get the raw repository listing, excluding forks"""
+        response = await client.get(
+            f"{self.base_url}/users/{self.username}/repos",
+            params={
+                "sort": sort,
+                "per_page": limit,
+                "type": "owner"
+            }
+        )
+        response.raise_for_status()
+        return [repo_data for repo_data in response.json() if not repo_data.get('fork', False)]
+    
+    def _start_language_lookups(self, client: httpx.AsyncClient, repos_data: List[Dict[str, Any]]) -> List[asyncio.Task]:
+        """Start one task per repository resolving to (index, repo, resolved)"""
+        async def resolve(index: int, repo_data: Dict[str, Any]) -> Tuple[int, GitHubRepoWithLanguages, bool]:
+            languages = await self._get_repo_languages_within_deadline(client, repo_data["full_name"])
+            return index, GitHubRepoWithLanguages(**repo_data, languages=languages or []), languages is not None
+        
+        return [asyncio.create_task(resolve(index, repo_data)) for index, repo_data in enumerate(repos_data)]
+    
+    async def _resolve_languages(self, lookups: List[asyncio.Task]) -> AsyncIterator[Tuple[int, GitHubRepoWithLanguages, bool]]:
+        """Yield (index, repo, resolved) tuples in the order the lookups complete"""
+        for next_done in asyncio.as_completed(lookups):
+            yield await next_done
+    
+    async def _fill_listing_cache(self, client: httpx.AsyncClient, cache_key: str, lookups: List[asyncio.Task]) -> None:
+        """Wait for every lookup of a listing, then cache it if all languages resolved"""
+        try:
+            results = sorted(await asyncio.gather(*lookups), key=lambda result: result[0])
+            if all(resolved for _, _, resolved in results):
+                repos_with_languages = [repo for _, repo, _ in results]
+                await self._cache_data(cache_key, [repo.dict() for repo in repos_with_languages])
+                self._record_metrics(repos_with_languages)
+        except Exception as e:
+            logger.error(f"Error caching repository listing {cache_key}: {str(e)}")
+        finally:
+            await client.aclose()
+    
+    def _schedule_background(self, coroutine: Awaitable[None]) -> None:
+        """Run work that shouldn't hold the response open"""
+        task = asyncio.create_task(coroutine)
+        # Keep a reference so the task isn't garbage collected before it finishes
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+    
+    async def _get_repo_languages_within_deadline(self, client: httpx.AsyncClient, full_name: str) -> Optional[List[GitHubLanguage]]:
+        """Get language statistics, or None if the lookup did not finish in time"""
+        async def lookup() -> List[GitHubLanguage]:
+            # Waiting for a slot counts against the deadline too
+            async with self.language_semaphore:
+                return await self._get_repo_languages(client, full_name)
+        
+        try:
+            return await within_deadline(lookup())
+        except UPSTREAM_TIMEOUTS:
+            logger.warning(f"Timed out fetching languages for {full_name}")
+            return None
+    
+    def _select_featured(self, repos: List[Any]) -> List[Any]:
+        """Pick the most starred repositories that have stars or a description"""
+        def field(repo: Any, name: str) -> Any:
+            return repo.get(name) if isinstance(repo, dict) else getattr(repo, name)
+        
+        return sorted(
+            [repo for repo in repos if field(repo, "stargazers_count") > 0 or field(repo, "description")],
+            key=lambda x: field(x, "stargazers_count"),
+            reverse=True
+        )[:6]
+    
+    def _repository_event(self, index: int, repo: GitHubRepoWithLanguages, languages_resolved: bool = True) -> Dict[str, Any]:
+        # languages_resolved is False when the lookup missed the deadline, as opposed to a repo with no languages
+        return {"event": "repository", "index": index, "languages_resolved": languages_resolved, "data": repo.dict()}
+    
+    def _complete_event(self, count: int, cached: bool) -> Dict[str, Any]:
+        deadline = current_deadline()
+        partial = deadline.partial if deadline else False
+        return {"event": "complete", "count": count, "cached": cached, "partial": partial}
+    
+    def _error_event(self, message: str) -> Dict[str, Any]:
+        return {"event": "error", "error": message}
+    
     async def _get_pinned_repositories(self) -> List[GitHubRepoWithLanguages]:
         """Get pinned repositories using GraphQL API"""
         try:
@@ -140,12 +353,16 @@ class GitHubService:
             }
             ''' % self.username
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
+            # Runs before the repository listing, so it only gets a share of the budget
+            deadline = current_deadline()
+            cap = deadline.remaining() * self.pinned_budget_share if deadline else None
+            
+            async with self._client() as client:
+                response = await within_deadline(client.post(
                     "https://api.github.com/graphql",
                     json={"query": query},
                     headers={"Authorization": f"Bearer {self._get_github_token()}"}
-                )
+                ), cap=cap)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -155,6 +372,10 @@ class GitHubService:
                 else:
                     return []
                     
+        except UPSTREAM_TIMEOUTS:
+            logger.warning("Timed out fetching pinned repositories")
+            mark_partial("pinned_repositories")
+            return []
         except Exception as e:
             logger.error(f"Error fetching pinned repositories: {str(e)}")
             return []
@@ -182,6 +403,8 @@ class GitHubService:
             
             return sorted(languages, key=lambda x: x.percentage, reverse=True)
             
+        except UPSTREAM_TIMEOUTS:
+            raise
         except Exception as e:
             logger.error(f"Error fetching languages for {full_name}: {str(e)}")
             return []
@@ -189,23 +412,36 @@ class GitHubService:
     async def _get_cached_data(self, key: str) -> Optional[Dict[Any, Any]]:
         """Get cached data from database"""
         try:
-            cached_item = await self.db.github_cache.find_one({"key": key})
-            if cached_item:
-                if datetime.utcnow() < cached_item["expires_at"]:
-                    return cached_item["data"]
-                else:
-                    # Remove expired cache
-                    await self.db.github_cache.delete_one({"key": key})
+            cached_item = await within_deadline(
+                self.db.github_cache.find_one({"key": key}, max_time_ms=max_time_ms())
+            )
+            # Expired entries are kept as the stale fallback for timed out refreshes
+            if cached_item and datetime.utcnow() < cached_item["expires_at"]:
+                return cached_item["data"]
             return None
         except Exception as e:
             logger.error(f"Error getting cached data: {str(e)}")
             return None
     
+    async def _get_stale_cached_data(self, key: str) -> Optional[Any]:
+        """Get the last cached copy regardless of expiry"""
+        try:
+            # Runs after the request budget is spent, so it gets its own short timeout
+            timeout = self.stale_read_timeout
+            cached_item = await asyncio.wait_for(
+                self.db.github_cache.find_one({"key": key}, max_time_ms=int(timeout * 1000)),
+                timeout
+            )
+            return cached_item["data"] if cached_item else None
+        except Exception as e:
+            logger.error(f"Error getting stale cached data: {str(e)}")
+            return None
+    
     async def _cache_data(self, key: str, data: Any) -> None:
         """Cache data in database"""
         try:
             expires_at = datetime.utcnow() + self.cache_duration
-            await self.db.github_cache.update_one(
+            await within_deadline(self.db.github_cache.update_one(
                 {"key": key},
                 {
                     "$set": {
@@ -216,13 +452,23 @@ class GitHubService:
                     }
                 },
                 upsert=True
-            )
+            ))
         except Exception as e:
             logger.error(f"Error caching data: {str(e)}")
     
+    def _record_metrics(self, repos: List[GitHubRepoWithLanguages]) -> None:
+        """Append a metrics snapshot for freshly fetched repositories"""
+        if self.metrics_service:
+            self.metrics_service.schedule_snapshot(repos)
+    
+    def _client(self) -> httpx.AsyncClient:
+        """HTTP client whose timeouts never exceed the remaining request budget"""
+        deadline = current_deadline()
+        timeout = deadline.timeout(self.http_timeout) if deadline else self.http_timeout
+        return httpx.AsyncClient(timeout=httpx.Timeout(max(timeout, 0.001)))
+    
     def _get_github_token(self) -> Optional[str]:
         """Get GitHub token from environment variables"""
-        import os
         return os.getenv("GITHUB_TOKEN")
     
     async def get_repository_stats(self) -> Dict[str, Any]:
@@ -0,0 +1,210 @@
+import asyncio
+from typing import List, Optional, Dict, Any, Set
+from datetime import datetime, timedelta
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError
+from models import GitHubRepoWithLanguages
+from services.deadline import within_deadline, max_time_ms
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+class MetricsService:
+    """Historical repository metrics: raw time-series points plus daily rollups"""
+    
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+        self.raw_retention_days = int(os.getenv("REPO_METRICS_RAW_RETENTION_DAYS", "30"))
+        self.write_timeout = float(os.getenv("REPO_METRICS_WRITE_TIMEOUT", "5"))
+        self.max_range_days = 730
+        # Raw points are only written once repo_metrics is confirmed to be an expiring time-series collection
+        self.raw_enabled = False
+        # The hourly dedupe relies on the unique (repo_id, day) index, so nothing is recorded until it's confirmed
+        self.rollups_enabled = False
+        self._pending: Set[asyncio.Task] = set()
+    
+    async def ensure_collections(self) -> None:
+        """Create or verify the time-series and rollup collections"""
+        expire_after = int(timedelta(days=self.raw_retention_days).total_seconds())
+        try:
+            existing = await self.db.list_collections(filter={"name": "repo_metrics"}).to_list(length=1)
+            if not existing:
+                await self.db.create_collection(
+                    "repo_metrics",
+                    timeseries={"timeField": "timestamp", "metaField": "repo", "granularity": "hours"},
+                    expireAfterSeconds=expire_after
+                )
+            else:
+                options = existing[0].get("options", {})
+                if "timeseries" not in options:
+                    logger.error(
+                        "repo_metrics exists but is not a time-series collection; raw metrics recording "
+                        "is disabled until it is dropped so it can be recreated"
+                    )
+                    return
+                if options.get("expireAfterSeconds") != expire_after:
+                    await self.db.command("collMod", "repo_metrics", expireAfterSeconds=expire_after)
+                    logger.info(f"Updated repo_metrics retention to {self.raw_retention_days} days")
+            self.raw_enabled = True
+        except Exception as e:
+            # Time-series collections need MongoDB 5.0+
+            logger.error(f"Error setting up repo_metrics collection, raw metrics recording is disabled: {str(e)}")
+        finally:
+            try:
+                await self.db.repo_metrics_daily.create_index(
+                    [("repo_id", ASCENDING), ("day", ASCENDING)], unique=True
+                )
+                await self.db.repo_metrics_daily.create_index([("day", ASCENDING)])
+                self.rollups_enabled = True
+            except Exception as e:
+                # e.g. duplicate rollup docs already exist and block the unique index
+                logger.error(f"Error creating repo_metrics_daily indexes, metrics recording is disabled: {str(e)}")
+    
+    def schedule_snapshot(self, repos: List[GitHubRepoWithLanguages]) -> None:
+        """Record a snapshot in the background, outside the request's deadline"""
+        task = asyncio.create_task(self.record_snapshot(repos))
+        # Keep a reference so the task isn't garbage collected before it finishes
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+    
+    async def record_snapshot(self, repos: List[GitHubRepoWithLanguages]) -> None:
+        """Record at most one metrics point per repository per hour and update its daily rollup"""
+        if not repos or not self.rollups_enabled:
+            return
+        
+        try:
+            now = datetime.utcnow()
+            hour = now.replace(minute=0, second=0, microsecond=0)
+            day = hour.replace(hour=0)
+            points = [self._metrics_point(repo, now) for repo in repos]
+            
+            # The last_hour filter makes repeat refreshes within the hour (other cache keys,
+            # limits or sorts) miss; their upsert then fails on the unique (repo_id, day) index
+            rollups = [
+                UpdateOne(
+                    {"repo_id": point["repo"]["id"], "day": day, "last_hour": {"$ne": hour}},
+                    {
+                        # Latest values of the day win; raw points keep the detail
+                        "$set": {
+                            "name": point["repo"]["name"],
+                            "stars": point["stars"],
+                            "forks": point["forks"],
+                            "open_issues": point["open_issues"],
+                            "size": point["size"],
+                            "languages": point["languages"],
+                            "last_hour": hour,
+                            "updated_at": now
+                        },
+                        "$max": {"stars_max": point["stars"]},
+                        "$min": {"stars_min": point["stars"]},
+                        "$inc": {"samples": 1}
+                    },
+                    upsert=True
+                )
+                for point in points
+            ]
+            duplicates: Set[int] = set()
+            try:
+                await asyncio.wait_for(
+                    self.db.repo_metrics_daily.bulk_write(rollups, ordered=False),
+                    self.write_timeout
+                )
+            except BulkWriteError as e:
+                errors = e.details.get("writeErrors", [])
+                duplicates = {error["index"] for error in errors if error.get("code") == DUPLICATE_KEY_ERROR}
+                if len(duplicates) < len(errors):
+                    raise
+            
+            new_points = [point for index, point in enumerate(points) if index not in duplicates]
+            # Raw points expire after raw_retention_days; the daily rollup is the downsampled copy
+            if new_points and self.raw_enabled:
+                await asyncio.wait_for(
+                    self.db.repo_metrics.insert_many(new_points, ordered=False),
+                    self.write_timeout
+                )
+        
+        except Exception as e:
+            logger.error(f"Error recording repository metrics: {str(e)}")
+    
+    async def get_trends(self, days: int = 90, repo: Optional[str] = None, interval: str = "day") -> Dict[str, Any]:
+        """Get per-repository trend series from the daily rollups"""
+        end = datetime.utcnow()
+        start = (end - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        trends = {
+            "interval": interval,
+            "start": start,
+            "end": end,
+            "series": []
+        }
+        
+        try:
+            match: Dict[str, Any] = {"day": {"$gte": start, "$lte": end}}
+            if repo:
+                match["name"] = repo
+            
+            pipeline: List[Dict[str, Any]] = [{"$match": match}, {"$sort": {"day": 1}}]
+            if interval == "week":
+                pipeline.append({
+                    "$group": {
+                        "_id": {
+                            "repo_id": "$repo_id",
+                            "day": {"$dateTrunc": {"date": "$day", "unit": "week", "startOfWeek": "monday"}}
+                        },
+                        "name": {"$last": "$name"},
+                        "stars": {"$last": "$stars"},
+                        "forks": {"$last": "$forks"},
+                        "open_issues": {"$last": "$open_issues"},
+                        "size": {"$last": "$size"},
+                        "languages": {"$last": "$languages"}
+                    }
+                })
+                pipeline.append({"$set": {"repo_id": "$_id.repo_id", "day": "$_id.day"}})
+                pipeline.append({"$sort": {"day": 1}})
+            
+            pipeline.append({
+                "$group": {
+                    "_id": "$repo_id",
+                    "name": {"$last": "$name"},
+                    "points": {
+                        "$push": {
+                            "date": "$day",
+                            "stars": "$stars",
+                            "forks": "$forks",
+                            "open_issues": "$open_issues",
+                            "size": "$size",
+                            "languages": "$languages"
+                        }
+                    }
+                }
+            })
+            pipeline.append({"$sort": {"name": 1}})
+            
+            time_limit = max_time_ms()
+            options = {"maxTimeMS": time_limit} if time_limit else {}
+            cursor = self.db.repo_metrics_daily.aggregate(pipeline, **options)
+            series = await within_deadline(cursor.to_list(length=None))
+            trends["series"] = [
+                {"repo_id": item["_id"], "name": item["name"], "points": item["points"]}
+                for item in series
+            ]
+            return trends
+        
+        except Exception as e:
+            logger.error(f"Error getting repository trends: {str(e)}")
+            return trends
+    
+    def _metrics_point(self, repo: GitHubRepoWithLanguages, timestamp: datetime) -> Dict[str, Any]:
+        # Language names are stored as values, not keys, so no field-name escaping is needed
+        return {
+            "timestamp": timestamp,
+            "repo": {"id": repo.id, "name": repo.name},
+            "stars": repo.stargazers_count,
+            "forks": repo.forks_count,
+            "open_issues": repo.open_issues_count,
+            "size": repo.size,
+            "languages": [{"language": lang.language, "bytes": lang.bytes} for lang in repo.languages]
+        }
@@ -35,6 +35,33 @@ apiClient.interceptors.response.use(
   }
 );
 
+// Read an NDJSON stream, invoking onEvent for every parsed line
+const streamNDJSON = async (path, params, onEvent) => {
+  const query = new URLSearchParams(params).toString();
+  const response = await fetch(`${API}${path}${query ? `?${query}` : ''}`);
+  if (!response.ok || !response.body) {
+    throw new Error(`Stream request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+
+    const lines = buffer.split('\n');
+    buffer = lines.pop();
+    lines.filter(Boolean).forEach(line => onEvent(JSON.parse(line)));
+
+    if (done) {
+      if (buffer.trim()) onEvent(JSON.parse(buffer));
+      break;
+    }
+  }
+};
+
 // GitHub API endpoints
 export const githubAPI = {
   async getUserInfo() {
@@ -69,6 +96,25 @@ export const githubAPI = {
     }
   },
 
+  // onEvent receives {event: 'repository', index, languages_resolved, data}, then {event: 'complete', count, cached, partial}
+  async streamRepositories(onEvent, limit = 10, sort = 'updated') {
+    try {
+      await streamNDJSON('/github/repositories/stream', { limit, sort }, onEvent);
+    } catch (error) {
+      console.error('Error streaming repositories:', error);
+      onEvent({ event: 'error', error: error.message });
+    }
+  },
+
+  async streamFeaturedRepositories(onEvent) {
+    try {
+      await streamNDJSON('/github/featured/stream', {}, onEvent);
+    } catch (error) {
+      console.error('Error streaming featured repositories:', error);
+      onEvent({ event: 'error', error: error.message });
+    }
+  },
+
   async getStats() {
     try {
       const response = await apiClient.get('/github/stats');
@@ -77,6 +123,18 @@ export const githubAPI = {
       console.error('Error fetching GitHub stats:', error);
       return {};
     }
+  },
+
+  async getTrends(days = 90, repo = null, interval = 'day') {
+    try {
+      const response = await apiClient.get('/github/trends', {
+        params: { days, interval, ...(repo ? { repo } : {}) }
+      });
+      return response.data;
+    } catch (error) {
+      console.error('Error fetching GitHub trends:', error);
+      return { series: [] };
+    }
   }
 };
 
@@ -104,6 +162,16 @@ export const contactAPI = {
     }
   },
 
+  async updateMessageStatuses(updates) {
+    try {
+      const response = await apiClient.patch('/contact/messages/status', { updates });
+      return response.data;
+    } catch (error) {
+      console.error('Error updating contact message statuses:', error);
+      throw error;
+    }
+  },
+
   async getStats() {
     try {
       const response = await apiClient.get('/contact/stats');
@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+from models import ContactStatusUpdate
+from services.contact_service import ContactService
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+class FakeMessages:
+    """Minimal stand-in for the contact_messages collection"""
+
+    def __init__(self, statuses, race=None):
+        self.docs = {message_id: {"id": message_id, "status": status} for message_id, status in statuses.items()}
+        # Statuses another admin writes (None deletes) between our read and our bulk write
+        self.race = race or {}
+        self.operations = []
+
+    def find(self, query, projection=None):
+        ids = query["id"]["$in"]
+        return FakeCursor([dict(self.docs[i]) for i in ids if i in self.docs])
+
+    async def bulk_write(self, operations, ordered=True):
+        for message_id, status in self.race.items():
+            if status is None:
+                del self.docs[message_id]
+            else:
+                self.docs[message_id] = {"id": message_id, "status": status, "status_update_id": "other"}
+        self.operations = operations
+        modified = 0
+        for op in operations:
+            for message_id in op._filter["id"]["$in"]:
+                doc = self.docs.get(message_id)
+                if doc and doc["status"] != op._filter["status"]["$ne"]:
+                    doc.update(op._doc["$set"])
+                    modified += 1
+        return SimpleNamespace(modified_count=modified)
+
+
+def run_update(messages, updates):
+    service = ContactService(SimpleNamespace(contact_messages=messages))
+    return asyncio.run(service.update_message_statuses(
+        [ContactStatusUpdate(id=message_id, status=status) for message_id, status in updates]
+    ))
+
+
+def results_by_id(response):
+    return {result.id: result.result for result in response.results}
+
+
+def test_classify_without_concurrent_changes():
+    results = ContactService._classify_status_updates(
+        {"a": "read", "b": "read", "c": "replied"},
+        {"a": "new", "b": "read"},
+        {"a"}
+    )
+    assert {r.id: r.result for r in results} == {"a": "updated", "b": "unchanged", "c": "not_found"}
+
+
+def test_classify_uses_reread_when_write_fell_short():
+    results = ContactService._classify_status_updates(
+        {"a": "read", "b": "read", "c": "replied", "d": "read"},
+        {"a": "new", "b": "new", "c": "new", "d": "new"},
+        {"a"},
+        {"a": "read", "b": "replied", "d": "read"}
+    )
+    assert {r.id: r.result for r in results} == {
+        "a": "updated", "b": "conflict", "c": "not_found", "d": "unchanged"
+    }
+
+
+def test_bulk_update_filters_on_current_status():
+    messages = FakeMessages({"a": "new", "b": "read", "c": "new"})
+    response = run_update(messages, [("a", "read"), ("b", "read"), ("c", "replied"), ("x", "read")])
+
+    assert response.success
+    assert response.modified_count == 2
+    assert results_by_id(response) == {"a": "updated", "b": "unchanged", "c": "updated", "x": "not_found"}
+    filters = sorted((op._filter["status"]["$ne"], op._filter["id"]["$in"]) for op in messages.operations)
+    assert filters == [("read", ["a"]), ("replied", ["c"])]
+
+
+def test_bulk_update_last_duplicate_wins():
+    messages = FakeMessages({"a": "new"})
+    response = run_update(messages, [("a", "read"), ("a", "replied")])
+
+    assert [(r.id, r.status, r.result) for r in response.results] == [("a", "replied", "updated")]
+
+
+def test_bulk_update_attributes_writes_when_racing():
+    messages = FakeMessages({"a": "new", "b": "new", "c": "new"}, race={"b": "replied", "c": "read"})
+    response = run_update(messages, [("a", "read"), ("b", "read"), ("c", "read")])
+
+    assert response.modified_count == 2
+    assert results_by_id(response) == {"a": "updated", "b": "updated", "c": "unchanged"}
+    tokens = {messages.docs[i]["status_update_id"] for i in ("a", "b")}
+    assert len(tokens) == 1 and "other" not in tokens
+
+
+def test_bulk_update_reports_messages_deleted_before_the_write():
+    messages = FakeMessages({"a": "new", "b": "new"}, race={"b": None})
+    response = run_update(messages, [("a", "replied"), ("b", "read")])
+
+    assert response.modified_count == 1
+    assert results_by_id(response) == {"a": "updated", "b": "not_found"}
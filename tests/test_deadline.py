@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+from services.deadline import (
+    Deadline, current_deadline, deadline_scope, mark_partial, max_time_ms,
+    stream_within_deadline, within_deadline
+)
+
+
+async def slow(seconds=1.0, value="done"):
+    await asyncio.sleep(seconds)
+    return value
+
+
+def test_deadline_expires():
+    deadline = Deadline(0.0)
+    assert deadline.remaining() == 0.0
+    assert deadline.timeout(cap=5) == 0.0
+    assert Deadline(10).timeout(cap=2) == 2
+
+
+def test_scope_sets_and_resets_current_deadline():
+    assert current_deadline() is None
+    with deadline_scope(1) as deadline:
+        assert current_deadline() is deadline
+    assert current_deadline() is None
+
+
+def test_within_deadline_without_deadline_just_awaits():
+    assert asyncio.run(within_deadline(slow(0.01))) == "done"
+
+
+def test_within_deadline_times_out():
+    async def run():
+        with deadline_scope(0.05):
+            await within_deadline(slow(1))
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(run())
+
+
+def test_within_deadline_zero_budget_closes_coroutine():
+    async def run():
+        coroutine = slow(0.01)
+        with deadline_scope(0):
+            with pytest.raises(asyncio.TimeoutError):
+                await within_deadline(coroutine)
+        # Closed rather than left un-awaited
+        assert coroutine.cr_frame is None
+
+    asyncio.run(run())
+
+
+def test_max_time_ms():
+    assert max_time_ms() is None
+    assert max_time_ms(cap=2) == 2000
+    with deadline_scope(0):
+        assert max_time_ms() == 1
+    with deadline_scope(10):
+        assert max_time_ms(cap=0.5) == 500
+
+
+def test_mark_partial_across_gathered_tasks():
+    async def lookup(source, seconds):
+        try:
+            return await within_deadline(slow(seconds))
+        except asyncio.TimeoutError:
+            mark_partial(source)
+
+    async def run():
+        with deadline_scope(0.05) as deadline:
+            await asyncio.gather(
+                lookup("fast", 0.001),
+                asyncio.create_task(lookup("slow", 1)),
+                lookup("slow", 1)
+            )
+        return deadline
+
+    deadline = asyncio.run(run())
+    assert deadline.partial
+    assert deadline.degraded == ["slow"]
+
+
+def test_mark_partial_without_deadline_is_noop():
+    mark_partial("anything")
+    assert current_deadline() is None
+
+
+def test_stream_within_deadline_applies_to_each_step_only():
+    seen = []
+
+    async def events():
+        seen.append(current_deadline())
+        yield 1
+        seen.append(current_deadline())
+        try:
+            await within_deadline(slow(1))
+        except asyncio.TimeoutError:
+            mark_partial("slow")
+        yield current_deadline().partial
+
+    async def run():
+        received = []
+        async for event in stream_within_deadline(0.05, events()):
+            # The consumer never sees the stream's deadline
+            assert current_deadline() is None
+            received.append(event)
+        return received
+
+    assert asyncio.run(run()) == [1, True]
+    assert seen[0] is not None and seen[0] is seen[1]
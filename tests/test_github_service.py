@@ -0,0 +1,265 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import httpx
+
+from services.deadline import deadline_scope, stream_within_deadline
+from services.github_service import GitHubService
+
+
+USER = {
+    "login": "KuyaMecky", "id": 1, "avatar_url": "https://github.com", "html_url": "https://github.com",
+    "public_repos": 1, "public_gists": 0, "followers": 0, "following": 0, "created_at": "", "updated_at": ""
+}
+
+
+def make_repo(repo_id, stars=1, description="A project"):
+    return {
+        "id": repo_id, "name": f"repo{repo_id}", "full_name": f"user/repo{repo_id}",
+        "description": description, "html_url": "https://github.com", "clone_url": "https://github.com",
+        "languages_url": "https://api.github.com", "stargazers_count": stars, "watchers_count": 0,
+        "forks_count": 0, "open_issues_count": 0, "size": 10,
+        "created_at": "", "updated_at": "", "pushed_at": ""
+    }
+
+
+class FakeCache:
+    """Stand-in for the github_cache collection"""
+
+    def __init__(self):
+        self.items = {}
+
+    def put(self, key, data, expired=False):
+        offset = timedelta(hours=-1 if expired else 1)
+        self.items[key] = {"key": key, "data": data, "expires_at": datetime.utcnow() + offset}
+
+    async def find_one(self, query, **kwargs):
+        return self.items.get(query["key"])
+
+    async def update_one(self, query, update, upsert=False):
+        self.items[query["key"]] = update["$set"]
+
+
+class FakeGitHub:
+    """httpx transport serving a repository listing with per-repo language delays"""
+
+    def __init__(self, repos, delays=None, listing_delay=0, listing_status=200, user_delay=0, user_status=200):
+        self.repos = repos
+        self.delays = delays or {}
+        self.listing_delay = listing_delay
+        self.listing_status = listing_status
+        self.user_delay = user_delay
+        self.user_status = user_status
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request):
+        path = request.url.path
+        self.requests.append(path)
+        if path.endswith("/repos"):
+            await asyncio.sleep(self.listing_delay)
+            return httpx.Response(self.listing_status, json=self.repos)
+        if path.endswith("/languages"):
+            repo_id = int(path.split("/")[-2][len("repo"):])
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                await asyncio.sleep(self.delays.get(repo_id, 0))
+            finally:
+                self.in_flight -= 1
+            return httpx.Response(200, json={"Python": 100 + repo_id})
+        if path.endswith("/users/KuyaMecky"):
+            await asyncio.sleep(self.user_delay)
+            return httpx.Response(self.user_status, json=USER)
+        # No pinned repositories without a token
+        return httpx.Response(401)
+
+
+def make_service(github):
+    cache = FakeCache()
+    service = GitHubService(SimpleNamespace(github_cache=cache))
+    service._client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(github.handle))
+    return service, cache
+
+
+async def collect(events, deadline=None):
+    if deadline is not None:
+        events = stream_within_deadline(deadline, events)
+    return [event async for event in events]
+
+
+def repository_events(events):
+    return [event for event in events if event["event"] == "repository"]
+
+
+def test_stream_repositories_emits_in_completion_order():
+    github = FakeGitHub([make_repo(0), make_repo(1), make_repo(2)], delays={0: 0.06, 2: 0.03})
+    service, cache = make_service(github)
+
+    events = asyncio.run(collect(service.stream_repositories(limit=3)))
+
+    assert [event["index"] for event in repository_events(events)] == [1, 2, 0]
+    assert [event["data"]["id"] for event in repository_events(events)] == [1, 2, 0]
+    assert all(event["languages_resolved"] for event in repository_events(events))
+    assert events[-1] == {"event": "complete", "count": 3, "cached": False, "partial": False}
+    assert [repo["id"] for repo in cache.items["repos_3_updated"]["data"]] == [0, 1, 2]
+
+
+def test_stream_repositories_flags_timed_out_lookup_and_skips_cache():
+    github = FakeGitHub([make_repo(0), make_repo(1)], delays={1: 1})
+    service, cache = make_service(github)
+
+    events = asyncio.run(collect(service.stream_repositories(limit=2), deadline=0.1))
+
+    resolved = {event["index"]: event["languages_resolved"] for event in repository_events(events)}
+    assert resolved == {0: True, 1: False}
+    assert repository_events(events)[1]["data"]["languages"] == []
+    assert events[-1]["partial"] is True
+    assert "repos_2_updated" not in cache.items
+
+
+def test_stream_repositories_serves_cache_without_upstream_calls():
+    github = FakeGitHub([])
+    service, cache = make_service(github)
+    cache.put("repos_2_updated", [dict(make_repo(5), languages=[]), dict(make_repo(6), languages=[])])
+
+    events = asyncio.run(collect(service.stream_repositories(limit=2)))
+
+    assert [event["data"]["id"] for event in repository_events(events)] == [5, 6]
+    assert events[-1]["cached"] is True
+    assert github.requests == []
+
+
+def test_stream_repositories_falls_back_to_stale_copy():
+    github = FakeGitHub([make_repo(0)], listing_delay=1)
+    service, cache = make_service(github)
+    cache.put("repos_1_updated", [dict(make_repo(7), languages=[])], expired=True)
+
+    events = asyncio.run(collect(service.stream_repositories(limit=1), deadline=0.1))
+
+    assert [event["data"]["id"] for event in repository_events(events)] == [7]
+    assert events[-1] == {"event": "complete", "count": 1, "cached": True, "partial": True}
+
+
+def test_stream_repositories_reports_upstream_errors():
+    github = FakeGitHub([], listing_status=500)
+    service, _ = make_service(github)
+
+    events = asyncio.run(collect(service.stream_repositories(limit=1)))
+
+    assert events == [{"event": "error", "error": "Error fetching GitHub repositories"}]
+
+
+def test_stream_featured_maps_positions_and_finishes_before_the_listing():
+    # Listing order differs from featured (most starred) order; repo 3 isn't featured and is slow
+    repos = [make_repo(0, stars=1), make_repo(1, stars=5), make_repo(2, stars=3), make_repo(3, stars=0, description=None)]
+    github = FakeGitHub(repos, delays={1: 0.04, 3: 0.3})
+    service, cache = make_service(github)
+
+    async def run():
+        started = time.monotonic()
+        events = await collect(service.stream_featured_repositories(), deadline=5)
+        elapsed = time.monotonic() - started
+        assert "repos_20_updated" not in cache.items
+        await asyncio.gather(*service._background)
+        return events, elapsed
+
+    events, elapsed = asyncio.run(run())
+
+    positions = {event["data"]["id"]: event["index"] for event in repository_events(events)}
+    assert positions == {1: 0, 2: 1, 0: 2}
+    assert repository_events(events)[-1]["data"]["id"] == 1
+    assert events[-1] == {"event": "complete", "count": 3, "cached": False, "partial": False}
+    assert elapsed < 0.25
+    # The background task filled the full listing cache afterwards
+    assert [repo["id"] for repo in cache.items["repos_20_updated"]["data"]] == [0, 1, 2, 3]
+
+
+def test_stream_featured_does_not_cache_incomplete_listing():
+    github = FakeGitHub([make_repo(0), make_repo(1, stars=0, description=None)], delays={1: 1})
+    service, cache = make_service(github)
+
+    async def run():
+        events = await collect(service.stream_featured_repositories(), deadline=0.2)
+        await asyncio.gather(*service._background)
+        return events
+
+    events = asyncio.run(run())
+
+    assert events[-1]["partial"] is False
+    assert "repos_20_updated" not in cache.items
+
+
+def test_select_featured_filters_and_sorts_by_stars():
+    repos = [make_repo(i, stars=i) for i in range(9)] + [make_repo(20, stars=0, description=None)]
+    repos[0]["stargazers_count"] = 0
+
+    featured = GitHubService(None)._select_featured(repos)
+
+    assert [repo["id"] for repo in featured] == [8, 7, 6, 5, 4, 3]
+    assert 20 not in [repo["id"] for repo in GitHubService(None)._select_featured(repos[-2:])]
+
+
+def test_language_lookups_are_bounded():
+    github = FakeGitHub([make_repo(i) for i in range(6)], delays={i: 0.02 for i in range(6)})
+    service, _ = make_service(github)
+    service.language_semaphore = asyncio.Semaphore(2)
+
+    repos = asyncio.run(service.get_repositories(limit=6))
+
+    assert len(repos) == 6 and all(repo.languages for repo in repos)
+    assert github.max_in_flight == 2
+
+
+def test_get_repositories_fills_timed_out_languages_from_stale_copy():
+    github = FakeGitHub([make_repo(0), make_repo(1)], delays={1: 1})
+    service, cache = make_service(github)
+    stale_languages = [{"language": "Rust", "bytes": 10, "percentage": 100.0}]
+    cache.put("repos_2_updated", [dict(make_repo(1), languages=stale_languages)], expired=True)
+    stale_entry = cache.items["repos_2_updated"]
+
+    async def run():
+        with deadline_scope(0.1) as deadline:
+            repos = await service.get_repositories(limit=2)
+        return repos, deadline
+
+    repos, deadline = asyncio.run(run())
+
+    assert repos[0].languages[0].language == "Python"
+    assert repos[1].languages[0].language == "Rust"
+    assert deadline.degraded == ["repository_languages"]
+    # The incomplete result isn't cached over the last good copy
+    assert cache.items["repos_2_updated"] is stale_entry
+
+
+def test_get_user_info_returns_stale_copy_on_timeout():
+    github = FakeGitHub([], user_delay=1)
+    service, cache = make_service(github)
+    cache.put("user_info", dict(USER, name="Cached"), expired=True)
+
+    async def run():
+        with deadline_scope(0.1) as deadline:
+            user = await service.get_user_info()
+        return user, deadline
+
+    user, deadline = asyncio.run(run())
+
+    assert user.name == "Cached"
+    assert deadline.degraded == ["user_info"]
+
+
+def test_get_user_info_without_stale_copy_returns_none():
+    github = FakeGitHub([], user_delay=1)
+    service, _ = make_service(github)
+
+    async def run():
+        with deadline_scope(0.1) as deadline:
+            return await service.get_user_info(), deadline
+
+    user, deadline = asyncio.run(run())
+
+    assert user is None
+    assert deadline.partial
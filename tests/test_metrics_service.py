@@ -0,0 +1,155 @@
+import asyncio
+
+from pymongo.errors import BulkWriteError
+
+from models import GitHubRepoWithLanguages
+from services.metrics_service import MetricsService
+
+
+def make_repo(repo_id, stars=1):
+    return GitHubRepoWithLanguages(
+        id=repo_id, name=f"repo{repo_id}", full_name=f"user/repo{repo_id}",
+        html_url="https://github.com", clone_url="https://github.com", languages_url="https://api.github.com",
+        stargazers_count=stars, watchers_count=0, forks_count=0, open_issues_count=0, size=10,
+        created_at="", updated_at="", pushed_at=""
+    )
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class FakeCollection:
+    def __init__(self):
+        self.inserted = []
+        self.indexes = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.inserted.extend(docs)
+
+    async def create_index(self, keys, **kwargs):
+        if kwargs.get("unique") and getattr(self, "has_duplicates", False):
+            raise Exception("E11000 duplicate key error")
+        self.indexes.append(keys)
+
+
+class FakeRollups(FakeCollection):
+    """Applies the (repo_id, day) uniqueness and last_hour filter of the daily rollups"""
+
+    def __init__(self):
+        super().__init__()
+        self.docs = {}
+
+    async def bulk_write(self, operations, ordered=True):
+        errors = []
+        for index, operation in enumerate(operations):
+            query = operation._filter
+            key = (query["repo_id"], query["day"])
+            doc = self.docs.get(key)
+            if doc is not None and doc.get("last_hour") == query["last_hour"]["$ne"]:
+                errors.append({"index": index, "code": 11000})
+                continue
+            doc = self.docs.setdefault(key, {"samples": 0})
+            doc.update(operation._doc["$set"])
+            doc["samples"] += operation._doc["$inc"]["samples"]
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+class FakeDatabase:
+    def __init__(self, existing=None):
+        self.existing = existing
+        self.created = []
+        self.commands = []
+        self.repo_metrics = FakeCollection()
+        self.repo_metrics_daily = FakeRollups()
+
+    def list_collections(self, filter=None):
+        return FakeCursor([self.existing] if self.existing else [])
+
+    async def create_collection(self, name, **options):
+        self.created.append((name, options))
+
+    async def command(self, name, collection, **options):
+        self.commands.append((name, collection, options))
+
+
+def test_creates_time_series_collection():
+    db = FakeDatabase()
+    service = MetricsService(db)
+    asyncio.run(service.ensure_collections())
+
+    assert service.raw_enabled
+    name, options = db.created[0]
+    assert name == "repo_metrics"
+    assert options["timeseries"]["timeField"] == "timestamp"
+    assert options["expireAfterSeconds"] == service.raw_retention_days * 86400
+    assert db.repo_metrics_daily.indexes
+
+
+def test_updates_changed_retention():
+    db = FakeDatabase({"name": "repo_metrics", "options": {"timeseries": {}, "expireAfterSeconds": 60}})
+    service = MetricsService(db)
+    asyncio.run(service.ensure_collections())
+
+    assert service.raw_enabled
+    assert db.commands == [("collMod", "repo_metrics", {"expireAfterSeconds": service.raw_retention_days * 86400})]
+
+
+def test_disables_raw_points_for_plain_collection():
+    db = FakeDatabase({"name": "repo_metrics", "options": {}})
+    service = MetricsService(db)
+    asyncio.run(service.ensure_collections())
+    asyncio.run(service.record_snapshot([make_repo(1)]))
+
+    assert not service.raw_enabled
+    assert db.repo_metrics.inserted == []
+    # Rollups are still kept
+    assert len(db.repo_metrics_daily.docs) == 1
+
+
+def test_repeat_refreshes_within_the_hour_count_once():
+    db = FakeDatabase()
+    service = MetricsService(db)
+    asyncio.run(service.ensure_collections())
+
+    # e.g. the repos_10, repos_20 and repos_100 cache keys refreshing back to back
+    asyncio.run(service.record_snapshot([make_repo(1), make_repo(2)]))
+    asyncio.run(service.record_snapshot([make_repo(1), make_repo(2), make_repo(3)]))
+    asyncio.run(service.record_snapshot([make_repo(3)]))
+
+    assert sorted(point["repo"]["id"] for point in db.repo_metrics.inserted) == [1, 2, 3]
+    assert [doc["samples"] for doc in db.repo_metrics_daily.docs.values()] == [1, 1, 1]
+
+
+def test_schedule_snapshot_runs_in_background():
+    db = FakeDatabase()
+    service = MetricsService(db)
+
+    async def run():
+        await service.ensure_collections()
+        service.schedule_snapshot([make_repo(1)])
+        assert service._pending
+        await asyncio.gather(*service._pending)
+
+    asyncio.run(run())
+    assert len(db.repo_metrics.inserted) == 1
+    assert not service._pending
+
+
+def test_records_nothing_when_unique_rollup_index_is_missing():
+    db = FakeDatabase()
+    db.repo_metrics_daily.has_duplicates = True
+    service = MetricsService(db)
+    asyncio.run(service.ensure_collections())
+    asyncio.run(service.record_snapshot([make_repo(1)]))
+    asyncio.run(service.record_snapshot([make_repo(1)]))
+
+    assert service.raw_enabled
+    assert not service.rollups_enabled
+    assert db.repo_metrics_daily.docs == {}
+    assert db.repo_metrics.inserted == []
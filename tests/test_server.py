@@ -0,0 +1,66 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import server
+from tests.test_github_service import FakeGitHub, make_repo, make_service
+
+
+@pytest.fixture
+def client_for(monkeypatch):
+    """Point the app at a stubbed GitHub and a fake cache under a short deadline"""
+    def build(github):
+        service, cache = make_service(github)
+        monkeypatch.setattr(server, "github_service", service)
+        monkeypatch.setattr(server, "GITHUB_DEADLINE_SECONDS", 0.2)
+        monkeypatch.setattr(server, "PORTFOLIO_DEADLINE_SECONDS", 0.2)
+        # Not entered as a context manager, so startup hooks don't try to reach Mongo
+        return TestClient(server.app), cache
+    return build
+
+
+def test_github_user_returns_503_when_budget_runs_out(client_for):
+    client, _ = client_for(FakeGitHub([], user_delay=1))
+
+    response = client.get("/api/github/user")
+
+    assert response.status_code == 503
+
+
+def test_github_user_returns_404_when_not_found(client_for):
+    client, _ = client_for(FakeGitHub([], user_status=404))
+
+    response = client.get("/api/github/user")
+
+    assert response.status_code == 404
+    assert "X-Partial-Response" not in response.headers
+
+
+def test_repositories_flag_partial_responses(client_for):
+    client, _ = client_for(FakeGitHub([make_repo(0), make_repo(1)], delays={1: 1}))
+
+    response = client.get("/api/github/repositories", params={"limit": 2})
+
+    assert response.status_code == 200
+    assert [repo["languages"] != [] for repo in response.json()] == [True, False]
+    assert response.headers["X-Partial-Response"] == "true"
+    assert response.headers["X-Partial-Sources"] == "repository_languages"
+
+
+def test_complete_responses_are_not_flagged(client_for):
+    client, _ = client_for(FakeGitHub([make_repo(0)]))
+
+    response = client.get("/api/github/repositories", params={"limit": 1})
+
+    assert response.status_code == 200
+    assert "X-Partial-Response" not in response.headers
+
+
+def test_portfolio_is_marked_partial(client_for):
+    client, _ = client_for(FakeGitHub([make_repo(0), make_repo(1)], delays={1: 1}, user_delay=1))
+
+    response = client.get("/api/portfolio")
+
+    assert response.status_code == 200
+    assert response.json()["partial"] is True
+    assert response.headers["X-Partial-Response"] == "true"
+    assert set(response.headers["X-Partial-Sources"].split(",")) == {"user_info", "repository_languages"}